@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Micro benchmarks for sortphotos.
+
+    python bench.py startup [-n RUNS]
+    python bench.py progress [-n RUNS]
+    python bench.py shard [-n PROCESSES]
+    python bench.py infer [-n RUNS]
+"""
+
+import sys
+import os
+import subprocess
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_times(module="sortphotos"):
+    """Return the `-X importtime` report of `module` as a list of
+    (cumulative_us, name) sorted by cost, heaviest first."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=HERE, capture_output=True, text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        rows.append((int(cumulative), name.rstrip()))
+    rows.sort(reverse=True)
+    return rows
+
+
+def bench_startup(runs=10):
+    rows = import_times()
+    total = next(us for us, name in rows if name.strip() == "sortphotos")
+    print(f"import sortphotos         : {total / 1000:8.2f} ms")
+    for us, name in rows[1:11]:
+        print(f"  {us / 1000:8.2f} ms {name}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "src")
+        dest = os.path.join(tmp, "dest")
+        os.makedirs(src)
+        cmd = [sys.executable, os.path.join(HERE, "sortphotos.py"), "-t", src, dest]
+
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(cmd, cwd=tmp, stdout=subprocess.DEVNULL, check=True)
+            timings.append(time.perf_counter() - start)
+
+        bare = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", "pass"], check=True)
+            bare.append(time.perf_counter() - start)
+
+    print(f"empty run (best of {runs})  : {min(timings) * 1000:8.2f} ms")
+    print(f"bare interpreter         : {min(bare) * 1000:8.2f} ms")
+
+
+def _hot_loop(files, counter=None):
+    start = time.perf_counter()
+    if counter is None:
+        for _ in range(files):
+            pass
+    else:
+        for _ in range(files):
+            counter.add(1, 4_000_000)
+    return time.perf_counter() - start
+
+
+def bench_progress(runs=10, files=200_000):
+    """Per-file cost of publishing progress, against the 100 us budget of a
+    10k files/s run. The reporters render to a fake TTY and to the log."""
+    import io
+    import logging
+    from progressbar import ProgressBar, ProgressCounter, ProgressReporter
+
+    class FakeTTY(io.StringIO):
+        def isatty(self):
+            return True
+
+    logger = logging.getLogger("bench.progress")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    baseline = min(_hot_loop(files) for _ in range(runs))
+
+    def reporter_run(stream, **kwargs):
+        counter = ProgressCounter()
+        with ProgressReporter(counter, total=files, title="bench", stream=stream,
+                              logger=logger, **kwargs):
+            return _hot_loop(files, counter)
+
+    tty = min(reporter_run(FakeTTY(), rate=10) for _ in range(runs))
+    log = min(reporter_run(io.StringIO(), log_interval=0.1) for _ in range(runs))
+
+    def legacy_run():
+        bar = ProgressBar(files, stream=FakeTTY())
+        start = time.perf_counter()
+        for i in range(files):
+            bar.update(i)
+        return time.perf_counter() - start
+
+    legacy = min(legacy_run() for _ in range(runs))
+
+    budget = 1e6 / 10_000  # us per file at 10k files/s
+    for label, elapsed in (("reporter, tty", tty), ("reporter, log", log),
+                           ("ProgressBar.update per file", legacy)):
+        per_file = (elapsed - baseline) / files * 1e6
+        print(f"{label:28}: {per_file:7.3f} us/file ({per_file / budget * 100:6.3f} % of 10k files/s)")
+
+
+class _FakeExifTool(object):
+    """Stands in for ExifTool in bench_shard: every file was shot at the same
+    time, so all shards sort into one folder and collide on names."""
+    started = True
+
+    def __init__(self, executable, lazy=False):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def get_metadata(self, *args):
+        return [{"SourceFile": args[-1], "EXIF:DateTimeOriginal": "2020:06:01 12:00:00"}]
+
+
+def _sort_shard(src, dest, shard, count):
+    import exiftool
+    import sortphotos
+    exiftool.ExifTool = _FakeExifTool
+    sortphotos.ask_continue = lambda prompt=None: True
+    sys.stdout = open(os.devnull, "w")
+    sortphotos.sortPhotos(src, dest, "%Y/%m-%b", None, recursive=True, copy_files=True,
+                          shard=(shard, count))
+
+
+def bench_shard(processes=4, dirs=50, files=40, duplicates=100):
+    """Run `processes` sortPhotos(..., shard=(i, N)) concurrently over one
+    source whose files all collide on a few names, sharing the default hash
+    store in the destination, and check no file was lost or overwritten.
+    Only ExifTool is stubbed."""
+    import hashlib
+    import multiprocessing
+    from hashstore import HASH_STORE_NAME
+
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    with tempfile.TemporaryDirectory(dir=base) as tmp:
+        src = os.path.join(tmp, "src")
+        dest = os.path.join(tmp, "dest")
+        os.makedirs(dest)
+        for d in range(dirs):
+            os.makedirs(os.path.join(src, f"{d:03d}CANON"))
+            for f in range(files):
+                with open(os.path.join(src, f"{d:03d}CANON", f"IMG_{f:04d}.JPG"), "wb") as fh:
+                    fh.write(f"{d}/{f}".encode() * 100)
+        # identical copies of existing files, under colliding names
+        for i in range(duplicates):
+            d, f = i % dirs, i % files
+            dup_dir = os.path.join(src, f"dup{d:03d}")
+            os.makedirs(dup_dir, exist_ok=True)
+            with open(os.path.join(dup_dir, f"IMG_{f:04d}.JPG"), "wb") as fh:
+                fh.write(f"{d}/{f}".encode() * 100)
+
+        def digests(top):
+            out = []
+            for root, _, names in os.walk(top):
+                for name in names:
+                    if name.startswith(HASH_STORE_NAME):
+                        continue
+                    with open(os.path.join(root, name), "rb") as fh:
+                        out.append(hashlib.blake2b(fh.read()).digest())
+            return out
+
+        workers = [multiprocessing.Process(target=_sort_shard, args=(src, dest, i, processes))
+                   for i in range(processes)]
+        start = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - start
+
+        total = dirs * files + duplicates
+        src_digests = digests(src)
+        dest_digests = digests(dest)
+        unique = len(set(src_digests))
+        empty = sum(1 for root, _, names in os.walk(dest) for name in names
+                    if not name.startswith(HASH_STORE_NAME)
+                    and os.path.getsize(os.path.join(root, name)) == 0)
+        missing = set(src_digests) - set(dest_digests)
+        exit_codes = [w.exitcode for w in workers]
+        import sqlite3
+        with sqlite3.connect(os.path.join(dest, HASH_STORE_NAME)) as conn:
+            cached = conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+
+        print(f"{processes} shards, {total} files ({unique} unique) in {elapsed * 1000:.0f} ms, "
+              f"exit codes {exit_codes}, {cached} digests in the shared store")
+        # identical files sorted at the same moment by two shards may both be kept
+        ok = (not any(exit_codes) and not missing and not empty
+              and unique <= len(dest_digests) <= total)
+        print(f"lost: {len(missing)}, leftover placeholders: {empty}, "
+              f"dest files: {len(dest_digests)} -> {'OK' if ok else 'FAILED'}")
+        if not ok:
+            sys.exit(1)
+
+
+def bench_infer(runs=10):
+    """Check infer_directory_dates() against synthetic ExifTool reads: every
+    file must be read or inferred exactly once, and every inferred date must
+    fall in the folder its real date sorts into."""
+    from datetime import datetime, timedelta
+    import sortphotos
+
+    # (files, spacing between shots, sort_format, day_begins, sample_size)
+    scenarios = [
+        (10, timedelta(days=1), "%Y/%m/%d", 0, 8),
+        (20, timedelta(days=1), "%Y/%m/%d", 0, 8),
+        (1000, timedelta(minutes=20), "%Y/%m/%d", 0, 8),
+        (1000, timedelta(minutes=20), "%Y/%m/%d", 4, 8),
+        (1000, timedelta(hours=2), "%Y/%m-%b", 0, 8),
+        (1000, timedelta(minutes=7), "%Y/%W/%a", 0, 3),
+        (500, timedelta(seconds=30), "%Y/%m/%d/%H", 0, 16),
+        (200, timedelta(0), "%Y", 0, 2),
+    ]
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for n, spacing, sort_format, day_begins, sample_size in scenarios:
+            folder = tempfile.mkdtemp(dir=tmp)
+            dates = {}
+            paths = []
+            for i in range(n):
+                path = os.path.join(folder, f"IMG_{i:04d}.JPG")
+                date = datetime(2020, 1, 30, 22) + spacing * i
+                with open(path, "wb"):
+                    pass
+                os.utime(path, (date.timestamp(), date.timestamp()))
+                dates[path] = date
+                paths.append(path)
+
+            def expected(path):
+                return sortphotos.date_bucket(dates[path], sort_format, day_begins)
+
+            elapsed = []
+            for _ in range(runs):
+                reads = []
+
+                def read_metadata(path):
+                    reads.append(path)
+                    return [{"SourceFile": path,
+                             "EXIF:DateTimeOriginal": dates[path].strftime("%Y:%m:%d %H:%M:%S")}]
+
+                start = time.perf_counter()
+                inferred = sortphotos.infer_directory_dates(paths, read_metadata, sort_format, day_begins,
+                                                            ["File"], [], sample_size)
+                elapsed.append(time.perf_counter() - start)
+
+            handled = reads + [record["SourceFile"] for record in inferred]
+            wrong = [record["SourceFile"] for record in inferred
+                     if sortphotos.date_bucket(sortphotos.parse_date_exif(record["Inferred:DateTime"]),
+                                               sort_format, day_begins) != expected(record["SourceFile"])]
+            ok = sorted(handled) == sorted(paths) and not wrong
+            failed = failed or not ok
+            print(f"{n:5} files, {sort_format:12} day_begins={day_begins}: {len(reads):4} read, "
+                  f"{len(inferred):4} inferred, {len(wrong)} wrong folder, "
+                  f"{min(elapsed) * 1000:7.2f} ms -> {'OK' if ok else 'FAILED'}")
+
+    if failed:
+        sys.exit(1)
+
+
+BENCHMARKS = {
+    "startup": bench_startup,
+    "progress": bench_progress,
+    "shard": bench_shard,
+    "infer": bench_infer,
+}
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="sortphotos micro benchmarks")
+    parser.add_argument("name", choices=BENCHMARKS.keys())
+    parser.add_argument("-n", "--runs", type=int, default=10,
+                        help="number of runs (number of processes for shard)")
+    args = parser.parse_args()
+    BENCHMARKS[args.name](args.runs)
+
+
+if __name__ == "__main__":
+    main()
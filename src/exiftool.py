@@ -1,16 +1,28 @@
-import subprocess
 import os
-import json
-from pathlib import Path
+
+import profiling
 
 
 class ExifTool(object):
     sentinel = "{ready}"
 
-    def __init__(self, executable: str|Path):
+    def __init__(self, executable: str|os.PathLike, lazy: bool = False):
         self.executable = executable
+        self.lazy = lazy
+        self.process = None
+        self._calls = 0
 
     def __enter__(self):
+        if not self.lazy:
+            self.start()
+        return self
+
+    @property
+    def started(self) -> bool:
+        return self.process is not None
+
+    def start(self):
+        import subprocess
         try:
             self.process = subprocess.Popen(
                 ["perl", self.executable, "-stay_open", "True", "-@", "-"],
@@ -23,19 +35,29 @@ class ExifTool(object):
             raise RuntimeError(f"Failed to start ExifTool: {e}")
 
         if self.process.poll() is not None:
-            raise RuntimeError(
+            self._abort(
                 f"ExifTool exited immediately with code {self.process.returncode}"
             )
 
         if not self.process.stdin or not self.process.stdout:
-            raise RuntimeError("ExifTool pipes not initialized")
+            self._abort("ExifTool pipes not initialized")
         
         if not self._health_check():
-            raise RuntimeError("ExifTool failed health check")
+            self._abort("ExifTool failed health check")
 
-        return self
+    def _abort(self, message):
+        # Leave the instance not started, so it never writes to a dead pipe
+        try:
+            self.process.kill()
+            self.process.wait()
+        except Exception:
+            pass
+        self.process = None
+        raise RuntimeError(message)
 
     def __exit__(self, exc_type, exc_value, traceback):
+        if self.process is None:
+            return
         try:
             self.process.stdin.write(b'-stay_open\nFalse\n')
             self.process.stdin.flush()
@@ -59,25 +81,31 @@ class ExifTool(object):
             return False
 
     def execute(self, *args):
-        args = args + ("-execute\n",)
-        self.process.stdin.write("\n".join(args).encode("utf-8"))
-        self.process.stdin.flush()
+        if self.process is None:
+            self.start()
+        self._calls += 1
+        with profiling.tracer.file_span("ExifTool.execute", self._calls, cat="exiftool"):
+            args = args + ("-execute\n",)
+            self.process.stdin.write("\n".join(args).encode("utf-8"))
+            self.process.stdin.flush()
 
-        output = ""
-        fd = self.process.stdout.fileno()
+            output = ""
+            fd = self.process.stdout.fileno()
 
-        while not output.rstrip().endswith(self.sentinel):
-            chunk = os.read(fd, 4096)
+            while not output.rstrip().endswith(self.sentinel):
+                chunk = os.read(fd, 4096)
 
-            if not chunk:
-                break
-            output += chunk.decode("utf-8", errors="replace")
+                if not chunk:
+                    break
+                output += chunk.decode("utf-8", errors="replace")
 
-        return output.replace(self.sentinel, "").strip()
+            return output.replace(self.sentinel, "").strip()
 
     def get_metadata(self, *args):
+        import json
         raw = self.execute(*args)
         try:
-            return json.loads(raw)
+            with profiling.tracer.file_span("json.loads", self._calls, cat="python"):
+                return json.loads(raw)
         except json.JSONDecodeError:
             raise RuntimeError(f"Invalid ExifTool output")
\ No newline at end of file
@@ -0,0 +1,94 @@
+import os
+import logging
+
+logger = logging.getLogger("sortphotos")
+
+
+HASH_STORE_NAME = ".sortphotos-hashes.db"
+
+
+class HashStore(object):
+    """Persistent cache of file digests.
+
+    Entries are keyed on (dev, inode, size, mtime_ns) so a file is only
+    hashed again once it has been modified or replaced. A file moved on the
+    same filesystem keeps its key, so a digest computed on the source is
+    still valid once the file sits in the archive.
+
+    Several processes (e.g. --shard) may share one store: it uses WAL and
+    commits every write on its own, so the write lock is only held for a
+    single insert. A write that still cannot get the lock is dropped, the
+    digest is just not cached. SQLite locking is unreliable on network
+    filesystems, so the store must not sit on NFS or SMB when several hosts
+    sort into one archive: give each host its own store with --hash-cache.
+    """
+
+    def __init__(self, path=None, timeout=30.0):
+        self.path = path if path is not None else ":memory:"
+        self.timeout = timeout
+        self.conn = None
+        self._errors = ()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        import sqlite3
+        self._errors = (sqlite3.OperationalError,)
+        self.conn = sqlite3.connect(self.path, timeout=self.timeout)
+        if self.path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            # A lost write only costs a re-hash, so skip the fsync per commit
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            " dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER,"
+            " kind TEXT, digest BLOB,"
+            " PRIMARY KEY (dev, ino, size, mtime_ns, kind))"
+        )
+        self.conn.commit()
+
+    def close(self):
+        if self.conn is None:
+            return
+        self.conn.close()
+        self.conn = None
+
+    @staticmethod
+    def key(path):
+        st = os.stat(path)
+        return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+    def get(self, path, kind):
+        if self.conn is None:
+            return None
+        row = self.conn.execute(
+            "SELECT digest FROM hashes"
+            " WHERE dev=? AND ino=? AND size=? AND mtime_ns=? AND kind=?",
+            self.key(path) + (kind,),
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, path, kind, digest):
+        if self.conn is None:
+            return
+        try:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)",
+                    self.key(path) + (kind, digest),
+                )
+        except self._errors as e:
+            logger.debug(f"⚠️ Digest not cached ({e}). file:{path}")
+
+    def digest(self, path, kind, func):
+        """Return the cached digest of `path`, computing it with `func` on a miss."""
+        digest = self.get(path, kind)
+        if digest is None:
+            digest = func(path)
+            self.put(path, kind, digest)
+        return digest
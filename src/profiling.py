@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+
+
+class _NullSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class NullTracer(object):
+    """Tracer used when profiling is off: every call is a no-op."""
+    enabled = False
+
+    def span(self, name, cat="stage", **args):
+        return _NULL_SPAN
+
+    def file_span(self, name, index, cat="file", **args):
+        return _NULL_SPAN
+
+    def begin(self, name, cat="stage", **args):
+        pass
+
+    def end(self, name, cat="stage"):
+        pass
+
+    def write(self):
+        pass
+
+
+class _Span(object):
+    __slots__ = ("tracer", "name", "cat", "args", "record")
+
+    def __init__(self, tracer, name, cat, args, record=True):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.record = record
+
+    def __enter__(self):
+        self.tracer._push(self.cat)
+        if self.record:
+            self.tracer._event("B", self.name, self.cat, self.args)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.record:
+            self.tracer._event("E", self.name, self.cat)
+        self.tracer._pop()
+        return False
+
+
+class Tracer(object):
+    """Records spans as Chrome trace events (also read by speedscope and
+    Perfetto), written to `path` as JSON.
+
+    Per-file spans are sampled: all of the first 1000 files, then one in 10
+    up to 10000, one in 100 up to 100000 and so on, unless `sample_every`
+    is given. With `cprofile`, cProfile runs only inside spans of category
+    "python", and is paused inside nested spans of any other category (the
+    ExifTool round trips, hashing, the filesystem), so the profile shows
+    where the Python stages themselves spend their time.
+    """
+    enabled = True
+
+    def __init__(self, path, sample_every=None, cprofile=False):
+        self.path = path
+        self.sample_every = sample_every
+        self.events = []
+        self.pid = os.getpid()
+        self._t0 = time.perf_counter_ns()
+        self._stack = []
+        self._profiler = None
+        self._profiling = False
+        self._main = threading.get_ident()
+        if cprofile:
+            import cProfile
+            self._profiler = cProfile.Profile()
+
+    def sampled(self, index):
+        if self.sample_every:
+            return index % self.sample_every == 0
+        if index < 1000:
+            return True
+        return index % 10 ** (len(str(index)) - 3) == 0
+
+    def span(self, name, cat="stage", **args):
+        return _Span(self, name, cat, args)
+
+    def file_span(self, name, index, cat="file", **args):
+        if self.sampled(index):
+            return _Span(self, name, cat, args)
+        if self._profiler is not None:
+            # not recorded, but still pauses or resumes cProfile
+            return _Span(self, name, cat, args, record=False)
+        return _NULL_SPAN
+
+    def _event(self, ph, name, cat, args=None):
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": ph,
+            "ts": (time.perf_counter_ns() - self._t0) / 1000,
+            "pid": self.pid,
+            "tid": threading.get_ident(),
+        }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def begin(self, name, cat="stage", **args):
+        self._push(cat)
+        self._event("B", name, cat, args)
+
+    def end(self, name, cat="stage"):
+        self._event("E", name, cat)
+        self._pop()
+
+    def _push(self, cat):
+        if threading.get_ident() == self._main:
+            self._stack.append(cat)
+            self._sync_profiler()
+
+    def _pop(self):
+        if threading.get_ident() == self._main and self._stack:
+            self._stack.pop()
+            self._sync_profiler()
+
+    def _sync_profiler(self):
+        if self._profiler is None:
+            return
+        want = bool(self._stack) and self._stack[-1] == "python"
+        if want and not self._profiling:
+            self._profiler.enable()
+        elif not want and self._profiling:
+            self._profiler.disable()
+        self._profiling = want
+
+    def write(self):
+        import json
+        with open(self.path, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+        if self._profiler is not None:
+            if self._profiling:
+                self._profiler.disable()
+                self._profiling = False
+            self._profiler.dump_stats(self.path + ".pstats")
+
+
+tracer = NullTracer()
+
+
+def enable(path, sample_every=None, cprofile=False):
+    """Start recording spans to `path`. Modules look up `profiling.tracer`
+    at call time, so this takes effect everywhere."""
+    global tracer
+    tracer = Tracer(path, sample_every, cprofile)
+    return tracer
+
+
+def disable():
+    """Write the trace (and the cProfile stats) and stop recording."""
+    global tracer
+    tracer.write()
+    tracer = NullTracer()
@@ -1,7 +1,7 @@
 import sys
-import shutil
 import threading
 import time
+import logging
 
 
 class ProgressBar:
@@ -25,16 +25,8 @@ class ProgressBar:
 
         self._blocks = ["█", "▏", "▎", "▍", "▌", "▋", "▊", "█"]
 
-    def update(self, step):
-        if not self.enabled:
-            return
-
+    def render(self, step):
         step = min(step, self.total)
-        if step == self._last_step:
-            return
-
-        self._last_step = step
-
         perc = step / self.total
         max_ticks = self.bar_width * 8
         num_ticks = int(round(perc * max_ticks))
@@ -52,8 +44,18 @@ class ProgressBar:
 
         if self.show_percent:
             disp += f" {perc * 100:6.2f} %"
+        return disp
+
+    def update(self, step):
+        if not self.enabled:
+            return
+
+        step = min(step, self.total)
+        if step == self._last_step:
+            return
 
-        self.stream.write(f"\r\x1b[2K{disp}")
+        self._last_step = step
+        self.stream.write(f"\r\x1b[2K{self.render(step)}")
         self.stream.flush()
 
     def finish(self):
@@ -63,28 +65,61 @@ class ProgressBar:
         self.stream.flush()
 
 
-class Spinner:
+class ProgressCounter:
+    """Counters published by the workers and read by a ProgressReporter.
+
+    Updating a counter is a plain attribute increment, without lock: each
+    counter has a single writer and the reporter only reads it.
+    """
+    __slots__ = ("files", "bytes")
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+
+    def add(self, files=1, nbytes=0):
+        self.files += files
+        self.bytes += nbytes
+
+
+class ProgressReporter:
+    """Renders a ProgressCounter from a background thread.
+
+    On a TTY the line (a bar when `total` is known, a spinner otherwise) is
+    redrawn at most `rate` times per second. Elsewhere a structured progress
+    line is written to `logger` every `log_interval` seconds, so unattended
+    runs still report progress. The hot loop never renders anything itself.
+    """
+
+    frames = "⠋⠙⠹⠸⠼⠴⠦⠧⠇⠏"
+
     def __init__(
         self,
-        init_message="",
-        message="Working",
-        delay=0.1,
+        counter,
+        total=None,
+        title="",
+        rate=4,
+        log_interval=10.0,
         stream=sys.stdout,
+        logger=None,
+        bar_width=40,
     ):
-        self.init_message = init_message
-        self._message = message
-        self.delay = delay
+        self.counter = counter
+        self.total = total
+        self.title = title
+        # Clamped so that a bad value can never make the thread spin
+        self.rate = min(max(rate, 0.1), 50)
+        self.log_interval = max(log_interval, 0.1)
         self.stream = stream
-        self.frames = "⠋⠙⠹⠸⠼⠴⠦⠧⠇⠏"
-        self.running = False
-        self.enabled = stream.isatty()
-        self._lock = threading.Lock()
+        self.logger = logger or logging.getLogger("sortphotos.progress")
+        self.tty = stream.isatty()
+        self.bar = ProgressBar(total or 1, bar_width=bar_width, stream=stream)
+        self._stop = threading.Event()
         self._thread = None
+        self._start = None
+        self._frame = 0
 
     def __enter__(self):
-        if self.enabled and self.init_message:
-            self.stream.write(self.init_message + "\n")
-            self.stream.flush()
         self.start()
         return self
 
@@ -92,34 +127,75 @@ class Spinner:
         self.stop(success=exc_type is None)
 
     def start(self):
-        if not self.enabled:
-            return
-        self.running = True
-        self._thread = threading.Thread(target=self._spin, daemon=True)
+        self._start = time.monotonic()
+        self._stop.clear()
+        if self.tty and self.title:
+            self.stream.write(self.title + "\n")
+            self.stream.flush()
+        self._thread = threading.Thread(target=self._run, daemon=True)
         self._thread.start()
 
-    def update(self, message):
-        with self._lock:
-            self._message = message
-
     def stop(self, success=True):
-        if not self.enabled:
+        if self._thread is None:
             return
-
-        self.running = False
+        self._stop.set()
         self._thread.join()
+        self._thread = None
 
-        symbol = "✔" if success else "✖"
-        self.stream.write(f"\r\x1b[2K{symbol} {self._message}\n")
-        self.stream.flush()
-
-    def _spin(self):
-        i = 0
-        while self.running:
-            frame = self.frames[i % len(self.frames)]
-            with self._lock:
-                msg = self._message
-            self.stream.write(f"\r\x1b[2K{frame} {msg}")
+        if self.tty:
+            symbol = "✔" if success else "✖"
+            self.stream.write(f"\r\x1b[2K{symbol} {self.summary()}\n")
             self.stream.flush()
-            time.sleep(self.delay)
-            i += 1
+        self.logger.info(self.structured(done=True))
+
+    def stats(self):
+        """Snapshot (files, bytes, elapsed, files/s, MB/s, eta) of the counter."""
+        files = self.counter.files
+        nbytes = self.counter.bytes
+        elapsed = max(time.monotonic() - self._start, 1e-9)
+        files_rate = files / elapsed
+        mb_rate = nbytes / elapsed / 1e6
+        eta = None
+        if self.total and files_rate > 0:
+            eta = max(self.total - files, 0) / files_rate
+        return files, nbytes, elapsed, files_rate, mb_rate, eta
+
+    def summary(self):
+        files, nbytes, elapsed, files_rate, mb_rate, eta = self.stats()
+        count = f"{files}/{self.total}" if self.total else f"{files}"
+        line = f"{count} files | {files_rate:.1f} files/s"
+        if nbytes:
+            line += f" | {mb_rate:.1f} MB/s"
+        line += f" | {elapsed:.0f}s"
+        if eta is not None:
+            line += f" | ETA {eta:.0f}s"
+        return line
+
+    def structured(self, done=False):
+        files, nbytes, elapsed, files_rate, mb_rate, eta = self.stats()
+        line = (f"progress title={self.title!r} files={files} total={self.total} "
+                f"elapsed_s={elapsed:.1f} files_per_s={files_rate:.1f}")
+        # bytes are only reported by the stages that track them
+        if nbytes:
+            line += f" bytes={nbytes} mb_per_s={mb_rate:.2f}"
+        if eta is not None:
+            line += f" eta_s={eta:.0f}"
+        if done:
+            line += " done=1"
+        return line
+
+    def render(self):
+        if self.total:
+            return f"{self.bar.render(self.counter.files)} {self.summary()}"
+        frame = self.frames[self._frame % len(self.frames)]
+        self._frame += 1
+        return f"{frame} {self.summary()}"
+
+    def _run(self):
+        delay = 1.0 / self.rate if self.tty else self.log_interval
+        while not self._stop.wait(delay):
+            if self.tty:
+                self.stream.write(f"\r\x1b[2K{self.render()}")
+                self.stream.flush()
+            else:
+                self.logger.info(self.structured())
@@ -3,24 +3,18 @@
 
 import sys
 import os
-import shutil
-import time
 import logging
-import logging.config
-from uuid import uuid1
-
-import filecmp
-from pathlib import Path
 from datetime import datetime, timedelta
 import re
-import locale
-from exiftool import ExifTool
+from stat import S_ISREG
 
-from progressbar import ProgressBar, Spinner
 from common import MEDIA_EXTENSIONS
+from hashstore import HashStore, HASH_STORE_NAME
+import profiling
 
-# Setting locale to the 'local' value
-locale.setlocale(locale.LC_ALL, '')
+# Heavier modules (shutil, hashlib, subprocess, sqlite3, the progress machinery)
+# are imported where they are first needed so that short scheduled runs over
+# an empty drop folder start fast.
 
 # init logging
 logger = logging.getLogger("sortphotos")
@@ -32,8 +26,8 @@ LOG_LEVELS = {
     "DEBUG":    logging.DEBUG,
 }
 
-exiftool_dir = Path("/home/usr2046/Github/sortphotos/src/Image-ExifTool-13.45")
-exiftool_path = exiftool_dir.joinpath('exiftool')
+exiftool_dir = "/home/usr2046/Github/sortphotos/src/Image-ExifTool-13.45"
+exiftool_path = os.path.join(exiftool_dir, 'exiftool')
 
 # -------- convenience methods -------------
 
@@ -127,47 +121,350 @@ def check_for_early_morning_photos(date, day_begins):
     return date
 
 
-_hash_cache = {}
+# -------- per-directory date inference -------------
 
-import hashlib
+INFER_SAMPLE_SIZE = 8
+INFER_MAX_STEPS = 4096
+
+# strftime directives by the finest time unit they depend on
+_SECOND_DIRECTIVES = set('STXcs')
+_MINUTE_DIRECTIVES = set('MR')
+_HOUR_DIRECTIVES = set('HIpkl')
+
+def sort_format_resolution(sort_format, day_begins=0):
+    """Time unit within which `sort_format` (with the day_begins shift)
+    always yields the same folder, or None if it cannot be bounded."""
+    directives = set(re.findall(r'%[-#_^0]?([A-Za-z%])', sort_format))
+    if 'f' in directives:
+        return None
+    if directives & _SECOND_DIRECTIVES:
+        return timedelta(seconds=1)
+    if directives & _MINUTE_DIRECTIVES:
+        return timedelta(minutes=1)
+    if directives & _HOUR_DIRECTIVES or day_begins:
+        return timedelta(hours=1)
+    return timedelta(days=1)
+
+def date_bucket(date, sort_format, day_begins=0):
+    if date.hour < day_begins:
+        date = date - timedelta(hours=date.hour+1)
+    return date.strftime(sort_format)
+
+def bucket_is_certain(start, end, sort_format, day_begins=0, max_steps=INFER_MAX_STEPS):
+    """True if every date between `start` and `end` sorts into the same folder.
+
+    Folder names are constant within one resolution unit, so walking the
+    units covering [start, end] is exact, for any sort_format."""
+    if end < start:
+        return False
+    step = sort_format_resolution(sort_format, day_begins)
+    if step is None:
+        return start == end
+
+    bucket = date_bucket(start, sort_format, day_begins)
+    if date_bucket(end, sort_format, day_begins) != bucket:
+        return False
+
+    t = datetime.min + ((start - datetime.min) // step) * step
+    for _ in range(max_steps):
+        t += step
+        if t > end:
+            return True
+        if date_bucket(t, sort_format, day_begins) != bucket:
+            return False
+    return False
+
+def file_sequence_number(path):
+    """Trailing number of the file name, e.g. 1234 for IMG_1234.JPG."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    m = re.search(r'(\d+)\D*$', stem)
+    return int(m.group(1)) if m else None
+
+def infer_directory_dates(paths, read_metadata, sort_format, day_begins,
+                          additional_groups_to_ignore, additional_tags_to_ignore,
+                          sample_size=INFER_SAMPLE_SIZE):
+    """Date the media files of one directory from a sample of full reads.
+
+    Files are ordered by their file-name sequence number and `sample_size`
+    of them, evenly spaced, are read with `read_metadata`. Between two
+    consecutive samples that fall into the same folder, a file is given a
+    date interpolated on its sequence number, provided its mtime lies
+    between the samples' mtimes. Ambiguous intervals are bisected with
+    further full reads. Returns metadata records for the inferred files;
+    every other file is passed to `read_metadata`.
+    """
+    sample_size = max(sample_size, 2)
+    read = set()
+
+    def read_one(path):
+        read.add(path)
+        return read_metadata(path)
+
+    numbered = []
+    for path in paths:
+        seq = file_sequence_number(path)
+        if seq is None:
+            read_one(path)
+        else:
+            numbered.append((seq, path))
+
+    if len(numbered) <= max(sample_size, 2):
+        for _, path in numbered:
+            read_one(path)
+        return []
+
+    numbered.sort()
+    samples = {}
+
+    def sample(i):
+        if i not in samples:
+            path = numbered[i][1]
+            md = read_one(path)
+            date = None
+            if md:
+                _, date, _ = get_oldest_timestamp(md[0], additional_groups_to_ignore,
+                                                  additional_tags_to_ignore)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                # Already read; an undated sample makes its intervals ambiguous
+                date, mtime = None, 0
+            samples[i] = (date, mtime)
+        return samples[i]
+
+    inferred = []
+
+    def infer(lo, hi):
+        if hi - lo < 2:
+            return
+        date_lo, mtime_lo = sample(lo)
+        date_hi, mtime_hi = sample(hi)
+        seq_lo, seq_hi = numbered[lo][0], numbered[hi][0]
+
+        if date_lo is None or date_hi is None or \
+                not bucket_is_certain(date_lo, date_hi, sort_format, day_begins):
+            # Reading the midpoint also covers the last file of a width-2 interval
+            mid = (lo + hi) // 2
+            sample(mid)
+            infer(lo, mid)
+            infer(mid, hi)
+            return
+
+        for i in range(lo + 1, hi):
+            seq, path = numbered[i]
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                # Let read_metadata record it as a bad file, as without inference
+                read_one(path)
+                continue
+            if not (mtime_lo <= mtime <= mtime_hi):
+                read_one(path)
+                continue
+            frac = (seq - seq_lo) / (seq_hi - seq_lo) if seq_hi != seq_lo else 0
+            date = date_lo + (date_hi - date_lo) * frac
+            inferred.append({'SourceFile': path,
+                             'Inferred:DateTime': date.strftime('%Y:%m:%d %H:%M:%S')})
+
+    step = (len(numbered) - 1) / (sample_size - 1)
+    bounds = sorted({int(round(i * step)) for i in range(sample_size)})
+    for i in bounds:
+        sample(i)
+    for lo, hi in zip(bounds, bounds[1:]):
+        infer(lo, hi)
+
+    # Every file must be either read or inferred, never dropped from the run
+    covered = read | {record['SourceFile'] for record in inferred}
+    for _, path in numbered:
+        if path not in covered:
+            logger.error(f'⚠️ Date inference missed a file, reading it. file:{path}')
+            read_one(path)
+
+    logger.debug(f'{len(inferred)}/{len(paths)} dates inferred from {len(samples)} samples '
+                 f'in {os.path.dirname(paths[0])}')
+    return inferred
 
-FAST_HASH_SIZE = 65536  # 64 KB
 
-def fast_hash(path, chunk_size=FAST_HASH_SIZE):
+FAST_HASH_SIZE = 65536  # 64 KB
+FAST_HASH_MAX_BLOCKS = 16  # interior blocks, on top of head and tail
+
+def fast_hash_offsets(size, chunk_size=FAST_HASH_SIZE, max_blocks=FAST_HASH_MAX_BLOCKS):
+    """Offsets of the blocks sampled by fast_hash(): head, tail and K evenly
+    spaced interior blocks. K grows with log2 of the file size so that large
+    videos, whose head and tail are often identical across clips, get sampled
+    more densely than small photos."""
+    chunk_size = max(chunk_size, 1)
+    max_blocks = max(max_blocks, 0)
+    if size <= 2 * chunk_size:
+        return [0]
+
+    ratio = size // (2 * chunk_size)
+    blocks = min(max_blocks, ratio.bit_length() - 1)
+    offsets = [0]
+    step = (size - chunk_size) / (blocks + 1)
+    for i in range(1, blocks + 1):
+        offsets.append(int(i * step))
+    offsets.append(size - chunk_size)
+    return offsets
+
+def fast_hash(path, chunk_size=FAST_HASH_SIZE, max_blocks=FAST_HASH_MAX_BLOCKS):
+    import hashlib
+    chunk_size = max(chunk_size, 1)
     h = hashlib.blake2b(digest_size=16)
     size = os.path.getsize(path)
+    h.update(size.to_bytes(8, "little"))
 
     with open(path, "rb") as f:
-        h.update(f.read(chunk_size))
-        if size > chunk_size:
-            f.seek(-chunk_size, os.SEEK_END)
+        if size <= 2 * chunk_size:
+            h.update(f.read())
+            return h.digest()
+        for offset in fast_hash_offsets(size, chunk_size, max_blocks):
+            f.seek(offset)
             h.update(f.read(chunk_size))
 
     return h.digest()
 
 def full_hash(path, block_size=1024 * 1024):
+    import hashlib
     h = hashlib.blake2b(digest_size=32)
     with open(path, "rb") as f:
         for chunk in iter(lambda: f.read(block_size), b""):
             h.update(chunk)
     return h.digest()
 
-def is_duplicate(src, dest):
+_hash_store = None
+
+def _default_hash_store():
+    """In-memory store used when no persistent store is given."""
+    global _hash_store
+    if _hash_store is None:
+        _hash_store = HashStore()
+        _hash_store.open()
+    return _hash_store
+
+def is_duplicate(src, dest, hash_store=None, chunk_size=FAST_HASH_SIZE, max_blocks=FAST_HASH_MAX_BLOCKS):
     if os.path.getsize(src) != os.path.getsize(dest):
         return False
 
-    key = (src, dest)
-
-    if key not in _hash_cache:
-        _hash_cache[key] = fast_hash(src), fast_hash(dest)
+    if hash_store is None:
+        hash_store = _default_hash_store()
 
-    if _hash_cache[key][0] != _hash_cache[key][1]:
+    # The sampling strategy is part of the cache key so that changing it
+    # never compares digests computed with different parameters.
+    kind = f"fast:{chunk_size}:{max_blocks}"
+    fast = lambda p: fast_hash(p, chunk_size, max_blocks)
+    if hash_store.digest(src, kind, fast) != hash_store.digest(dest, kind, fast):
         return False
 
+    # Small files are hashed whole by fast_hash, no need to read them again
+    if os.path.getsize(src) <= 2 * chunk_size:
+        return True
+
     # Only now do the expensive check
-    return full_hash(src) == full_hash(dest)
+    return hash_store.digest(src, "full", full_hash) == hash_store.digest(dest, "full", full_hash)
+
+def parse_shard(value):
+    """Parse a `i/N` shard specification (0 <= i < N) into (i, N)."""
+    try:
+        index, count = (int(v) for v in value.split('/'))
+    except ValueError:
+        raise ValueError(f"invalid shard '{value}', expected i/N")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"invalid shard '{value}', expected 0 <= i < N")
+    return index, count
+
+def file_shard(rel_path, count):
+    """Shard of a source file, from a hash of its path relative to the
+    source directory so that every host agrees whatever the mount point."""
+    import hashlib
+    digest = hashlib.blake2b(rel_path.replace(os.sep, '/').encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') % count
+
+def claim_dest_file(path, test=False):
+    """Atomically reserve `path` by creating it empty with O_EXCL.
+
+    Returns False if the name is already taken. Unlike an os.path.isfile()
+    check followed by the move, no other process (e.g. another --shard) can
+    claim the same name in between. In test mode nothing is created.
+    """
+    if test:
+        return not os.path.isfile(path)
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except FileExistsError:
+        return False
+    os.close(fd)
+    return True
+
+def place_file(src_file, dest_file, copy_files=False, test=False, remove_duplicates=True,
+               keep_filename=False, hash_store=None, fast_hash_size=FAST_HASH_SIZE,
+               fast_hash_blocks=FAST_HASH_MAX_BLOCKS, progress=None):
+    """Move or copy `src_file` to `dest_file`, or to the first free
+    `<name>_<n><ext>` variant of it. Returns the destination used, or None
+    if an identical file is already there. The bytes moved or copied are
+    added to the `progress` ProgressCounter, if given."""
+    root, ext = os.path.splitext(dest_file)
+
+    # Duplicate detection
+    append = 1
+    while not claim_dest_file(dest_file, test):
+
+        logger.debug(f'src_file: {src_file}')
+        logger.debug(f'dest_file: {dest_file}')
+
+        if remove_duplicates and os.path.isfile(dest_file):
+            with profiling.tracer.span("is_duplicate", cat="hash"):
+                identical = is_duplicate(src_file, dest_file, hash_store, fast_hash_size, fast_hash_blocks)
+            if identical:
+                logger.debug("⚠️ Identical file already exists. Duplicate will be ignored.")
+                return None
+
+        # Filename collision -> generate new name
+        if keep_filename:
+            orig = os.path.splitext(os.path.basename(src_file))[0]
+            dest_file = f"{root}_{orig}_{append}{ext}"
+        else:
+            dest_file = f"{root}_{append}{ext}"
+
+        append += 1
+        logger.debug("⚠️ Same name already exists...renaming to: %s", dest_file)
+
+    if test:
+        return dest_file
+
+    # The claimed (empty) file is replaced by the real one. os.replace()
+    # overwrites it atomically on every platform, where shutil.move() would
+    # fall back to a full copy on Windows since os.rename() refuses to.
+    import shutil
+    placeholder = os.stat(dest_file)
+    try:
+        src_stat = os.stat(src_file)
+        if copy_files:
+            shutil.copy2(src_file, dest_file)
+        elif src_stat.st_dev == os.stat(dest_file).st_dev:
+            os.replace(src_file, dest_file)
+        else:
+            shutil.move(src_file, dest_file)
+    except BaseException:
+        # This call claimed the name, so our untouched placeholder is always
+        # removed; once the move or copy has started, whatever is left there
+        # (e.g. a truncated copy) is only removed if the source survives
+        try:
+            current = os.lstat(dest_file)
+        except OSError:
+            current = None
+        if current is not None:
+            untouched = (current.st_ino == placeholder.st_ino and
+                         current.st_dev == placeholder.st_dev and current.st_size == 0)
+            if untouched or os.path.exists(src_file):
+                os.remove(dest_file)
+        raise
+    if progress is not None:
+        progress.bytes += src_stat.st_size
+    return dest_file
 
 def is_hidden(path):
+    from pathlib import Path
     p = Path(path)
 
     if sys.platform == "win32":
@@ -182,7 +479,8 @@ def is_hidden(path):
 
 def ask_continue(prompt="Continue? [y/N]: "):
     try:
-        resp = input(prompt).strip().lower()
+        with profiling.tracer.span("ask_continue", cat="wait"):
+            resp = input(prompt).strip().lower()
     except EOFError:
         return False
     return resp in ("y", "yes")
@@ -192,16 +490,32 @@ def ask_continue(prompt="Continue? [y/N]: "):
 def sortPhotos(src_dir, dest_dir, sort_format, rename_format, recursive=False,
                copy_files=False, test=False, remove_duplicates=True, day_begins=0,
                additional_groups_to_ignore=['File'], additional_tags_to_ignore=[],
-               use_only_groups=None, use_only_tags=None, verbose=True, keep_filename=False):
+               use_only_groups=None, use_only_tags=None, verbose=True, keep_filename=False,
+               hash_cache=True, hash_cache_path=None, fast_hash_size=FAST_HASH_SIZE,
+               fast_hash_blocks=FAST_HASH_MAX_BLOCKS, infer_dates=False,
+               infer_sample=INFER_SAMPLE_SIZE, progress_interval=10.0, shard=None):
+
+    import locale
+    import time
+    from exiftool import ExifTool
+    from progressbar import ProgressCounter, ProgressReporter
+
+    # Setting locale to the 'local' value
+    locale.setlocale(locale.LC_ALL, '')
 
     logger.info("=" * 64)
     logger.info("SORTPHOTOS - PROCESSING...")
     logger.info("=" * 64)
 
-    run_id = uuid1().time
+    # Same value as uuid.uuid1().time (100 ns ticks since 1582-10-15)
+    # without paying for the uuid import
+    run_id = time.time_ns() // 100 + 0x01b21dd213814000
     sys.stdout.write(f'Run ID: {run_id}\n')
     logger.info(f'Run ID: {run_id}')
 
+    if isinstance(shard, str):
+        shard = parse_shard(shard)
+
     mode = "DRY RUN" if test else "🔥 LIVE 🔥"
     action = "copy" if copy_files else "move" 
 
@@ -233,132 +547,155 @@ def sortPhotos(src_dir, dest_dir, sort_format, rename_format, recursive=False,
     skipped_files = []
     duplicate_files = []
     unknown_date_files = []
-
-    # Preprocessing with ExifTool
-    with Spinner(f"{mode} - Reading EXIF metadata with ExifTool") as spinner:
-        with ExifTool(exiftool_path) as exiftool:
+    inferred_files = 0
+
+    # Preprocessing with ExifTool, only started once a media file is found
+    scanned = ProgressCounter()
+    with profiling.tracer.span("scan"), \
+            ProgressReporter(scanned, title=f"{mode} - Reading EXIF metadata with ExifTool",
+                             log_interval=progress_interval, logger=logger):
+        with ExifTool(exiftool_path, lazy=True) as exiftool:
             logger.info("Preprocessing with ExifTool (file-by-file, safe mode).")
 
-            if not test:
-                time.sleep(2) # for urgent cancel
+            def read_metadata(file_path):
+                # Started outside the per-file try so that a broken ExifTool
+                # stops the run instead of marking every file as bad
+                if not exiftool.started:
+                    if not test:
+                        time.sleep(2) # for urgent cancel
+                    exiftool.start()
+
+                try:
+                    md = exiftool.get_metadata(*args, file_path)
+                    if not md:
+                        bad_files.append(file_path)
+                        logger.error(f'⚠️ Fail to get metadata. file:{file_path}')
+                        return None
+                    metadata.extend(md)
+                    return md
+                except Exception:
+                    bad_files.append(file_path)
+                    logger.error(f'⚠️ Fail to get metadata. file:{file_path}')
+                    return None
 
-            files_found = 0
             for root, _, files in os.walk(src_dir):
+                media_files = []
                 for name in files:
                     file_path = os.path.join(root, name)
                     ext = os.path.splitext(name)[1].lower()
 
-                    if Path(file_path).is_file():
-                        files_found += 1
-                        spinner.update(f"Processed files: {files_found}")
+                    if shard is not None and \
+                            file_shard(os.path.relpath(file_path, src_dir), shard[1]) != shard[0]:
+                        continue
+
+                    try:
+                        st = os.stat(file_path)
+                    except OSError:
+                        st = None
+                    if st is not None and S_ISREG(st.st_mode):
+                        scanned.add(1, st.st_size)
 
                     if ext not in MEDIA_EXTENSIONS:
                         skipped_files.append(file_path)
                         logger.debug(f'⚠️ Invalid file extension. file:{file_path}')
                         continue
 
-                    try:
-                        md = exiftool.get_metadata(*args, file_path)
-                        if not md:
-                            bad_files.append(file_path)
-                            logger.error(f'⚠️ Fail to get metadata. file:{file_path}')
-                            continue
-                        metadata.extend(md)
-                    except Exception:
-                        bad_files.append(file_path)
-                        logger.error(f'⚠️ Fail to get metadata. file:{file_path}') 
+                    media_files.append(file_path)
 
+                # Renaming needs each file's exact date, inference only gives the folder
+                if infer_dates and rename_format is None:
+                    with profiling.tracer.span("infer_directory_dates", cat="python", dir=root):
+                        inferred = infer_directory_dates(media_files, read_metadata, sort_format, day_begins,
+                                                         additional_groups_to_ignore, additional_tags_to_ignore,
+                                                         infer_sample)
+                    inferred_files += len(inferred)
+                    metadata.extend(inferred)
+                else:
+                    for file_path in media_files:
+                        read_metadata(file_path)
 
-    if not ask_continue():
+
+    files_found = scanned.files
+
+    if not metadata:
+        logger.info("Nothing to sort.")
+    elif not ask_continue():
         logger.info("Aborted by user")
         logger.info("=" * 64)
         sys.exit(1)
 
-    title = "copying" if copy_files else "moving"
-    progress = ProgressBar(len(metadata) - 1, title=f"Sorting photos ({title})")
-
-    # Actions
-    cnt = 0
-    for idx, data in enumerate(metadata):
-        src_file, date, keys = get_oldest_timestamp(data, additional_groups_to_ignore, additional_tags_to_ignore)
-        src_file.encode('utf-8')
-
-        if test:
-            m = '(DRY RUN - no files are being moved/copied)'
-        else:
-            m= ""
-        logger.debug(f"[{idx+1}/{len(metadata)}] {m}")
-        logger.debug('Source: ' + src_file)
-
-        # if no valid date or hidden -> log
-        if not date or is_hidden(src_file):
-            unknown_date_files.append(src_file)
-            continue
-
-        logger.debug('Date/Time: ' + str(date))
-        logger.debug('Corresponding Tags: ' + ', '.join(keys))
-
-        date = check_for_early_morning_photos(date, day_begins)
-        dir_structure = date.strftime(sort_format)
-        dirs = dir_structure.split('/')
-        dest_file = dest_dir
-        for thedir in dirs:
-            dest_file = os.path.join(dest_file, thedir)
-            if not test and not os.path.exists(dest_file):
-                os.makedirs(dest_file)
-
-        filename = os.path.basename(src_file)
-        if rename_format is not None and date is not None:
-            _, ext = os.path.splitext(filename)
-            filename = date.strftime(rename_format) + ext.lower()
-
-        dest_file = os.path.join(dest_file, filename)
-        root, ext = os.path.splitext(dest_file)
-
-        name = 'Destination '
-        name += '(copy): ' if copy_files else '(move): '
-        logger.debug(name + dest_file)
-
-        # Duplicate detection
-        append = 1
-        file_is_identical = False
-        while os.path.isfile(dest_file):
-
-            logger.debug(f'src_file: {src_file}')
-            logger.debug(f'dest_file: {dest_file}')
-
-            if remove_duplicates and is_duplicate(src_file, dest_file):
-                file_is_identical = True
-                logger.debug("⚠️ Identical file already exists. Duplicate will be ignored.")
-                break
-
-            # Filename collision -> generate new name
-            if keep_filename:
-                orig = os.path.splitext(os.path.basename(src_file))[0]
-                dest_file = f"{root}_{orig}_{append}{ext}"
-            else:
-                dest_file = f"{root}_{append}{ext}"
-
-            append += 1
-            logger.debug("⚠️ Same name already exists...renaming to: %s", dest_file)
-
-        if file_is_identical:
-            duplicate_files.append(src_file)
-            continue
-
-        if not test:
-            if copy_files:
-                shutil.copy2(src_file, dest_file)
-            else:
-                shutil.move(src_file, dest_file)
-        
-        cnt += 1
-
-        progress.update(idx)
-        # percent_complete(step=cnt, total_steps=len(metadata) - 1, title=f"{title} ({mode})")
-        # print()
+    # Digests are cached across runs next to the archive (in memory for dry runs)
+    if hash_cache and not test:
+        if hash_cache_path is None:
+            hash_cache_path = os.path.join(dest_dir, HASH_STORE_NAME)
+        hash_store = HashStore(hash_cache_path)
+    else:
+        hash_store = HashStore()
+    if metadata:
+        if hash_store.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(hash_store.path)), exist_ok=True)
+        hash_store.open()
 
-    progress.finish()
+    title = "copying" if copy_files else "moving"
+    sorted_files = ProgressCounter()
+    try:
+        with profiling.tracer.span("sort", cat="python"), \
+                ProgressReporter(sorted_files, total=len(metadata), title=f"Sorting photos ({title})",
+                                 log_interval=progress_interval, logger=logger):
+            # Actions
+            cnt = 0
+            for idx, data in enumerate(metadata):
+                sorted_files.add()
+                with profiling.tracer.file_span("get_oldest_timestamp", idx, cat="python"):
+                    src_file, date, keys = get_oldest_timestamp(data, additional_groups_to_ignore, additional_tags_to_ignore)
+                src_file.encode('utf-8')
+
+                if test:
+                    m = '(DRY RUN - no files are being moved/copied)'
+                else:
+                    m= ""
+                logger.debug(f"[{idx+1}/{len(metadata)}] {m}")
+                logger.debug('Source: ' + src_file)
+
+                # if no valid date or hidden -> log
+                if not date or is_hidden(src_file):
+                    unknown_date_files.append(src_file)
+                    continue
+
+                logger.debug('Date/Time: ' + str(date))
+                logger.debug('Corresponding Tags: ' + ', '.join(keys))
+
+                date = check_for_early_morning_photos(date, day_begins)
+                dir_structure = date.strftime(sort_format)
+                dirs = dir_structure.split('/')
+                dest_file = dest_dir
+                for thedir in dirs:
+                    dest_file = os.path.join(dest_file, thedir)
+                    if not test:
+                        os.makedirs(dest_file, exist_ok=True)
+
+                filename = os.path.basename(src_file)
+                if rename_format is not None and date is not None:
+                    _, ext = os.path.splitext(filename)
+                    filename = date.strftime(rename_format) + ext.lower()
+
+                dest_file = os.path.join(dest_file, filename)
+
+                name = 'Destination '
+                name += '(copy): ' if copy_files else '(move): '
+                logger.debug(name + dest_file)
+
+                with profiling.tracer.file_span("place_file", idx, cat="fs", src=src_file):
+                    dest_file = place_file(src_file, dest_file, copy_files, test, remove_duplicates,
+                                           keep_filename, hash_store, fast_hash_size, fast_hash_blocks,
+                                           sorted_files)
+                if dest_file is None:
+                    duplicate_files.append(src_file)
+                    continue
+
+                cnt += 1
+    finally:
+        hash_store.close()
 
     logger.info("")
     logger.info("=" * 64)
@@ -369,6 +706,8 @@ def sortPhotos(src_dir, dest_dir, sort_format, rename_format, recursive=False,
     logger.info(f"Action                          : {action}")
     logger.info(f"Source files detected           : {files_found}")
     logger.info(f"Source                          : {src_dir}")
+    if shard is not None:
+        logger.info(f"Shard                           : {shard[0]}/{shard[1]}")
     logger.info(f"Destination                     : {dest_dir}")
     logger.info("")
 
@@ -383,6 +722,7 @@ def sortPhotos(src_dir, dest_dir, sort_format, rename_format, recursive=False,
     logger.info("-" * 63)
     logger.info(f"Bad / unreadable files      : {len(bad_files)}")
     logger.info(f"Unknown date/ hidden files  : {len(unknown_date_files)}")
+    logger.info(f"Dates inferred (no ExifTool): {inferred_files}")
     logger.info("")
 
     files_affected = cnt
@@ -451,6 +791,35 @@ def main():
                         help='In case of duplicated output filenames append original file name and number')
     parser.add_argument('--keep-duplicates', action='store_true',
                         help='If file is a duplicate keep it anyway (after renaming).')
+    parser.add_argument('--no-hash-cache', action='store_true',
+                        help='do not keep file digests across runs')
+    parser.add_argument('--hash-cache', type=str, default=None,
+                        help=f'file used to keep digests across runs (default: dest_dir/{HASH_STORE_NAME})')
+    parser.add_argument('--fast-hash-size', type=int, default=FAST_HASH_SIZE,
+                        help=f'size in bytes of each block sampled by the fast hash (default: {FAST_HASH_SIZE})')
+    parser.add_argument('--fast-hash-blocks', type=int, default=FAST_HASH_MAX_BLOCKS,
+                        help=f'maximum number of interior blocks sampled by the fast hash (default: {FAST_HASH_MAX_BLOCKS})')
+    parser.add_argument('--infer-dates', action='store_true',
+                        help='read the metadata of a sample of files per directory and infer the\n'
+                             'destination folder of the others from their file-name sequence\n'
+                             'number and modification time (ignored with --rename)')
+    parser.add_argument('--infer-sample', type=int, default=INFER_SAMPLE_SIZE,
+                        help=f'number of files sampled per directory with --infer-dates (default: {INFER_SAMPLE_SIZE})')
+    parser.add_argument('--progress-interval', type=float, default=10.0,
+                        help='seconds between progress lines written to the log when\n'
+                             'the output is not a terminal (default: 10)')
+    parser.add_argument('--shard', type=str, default=None, metavar='i/N',
+                        help='only sort the i-th of N deterministic partitions of the source files\n'
+                             '(0 <= i < N), so that N processes or hosts can share one source')
+    parser.add_argument('--profile', type=str, default=None, metavar='TRACE_JSON',
+                        help='write a Chrome trace-event JSON of the run (open it in\n'
+                             'chrome://tracing, Perfetto or speedscope)')
+    parser.add_argument('--profile-sample', type=int, default=None, metavar='N',
+                        help='with --profile, record per-file spans for one file in N\n'
+                             '(default: all of the first 1000 files, then fewer and fewer)')
+    parser.add_argument('--profile-cprofile', action='store_true',
+                        help='with --profile, also run cProfile on the Python stages only\n'
+                             'and write its stats to TRACE_JSON.pstats')
     parser.add_argument('--day-begins', type=int, default=0, help='hour of day that new day begins (0-23)')
     parser.add_argument('--ignore-groups', type=str, nargs='+', default=[], help='groups to ignore')
     parser.add_argument('--ignore-tags', type=str, nargs='+', default=[], help='tags to ignore')
@@ -467,6 +836,20 @@ def main():
 
     args = parser.parse_args()
 
+    if args.progress_interval <= 0:
+        parser.error("--progress-interval must be > 0")
+    if args.fast_hash_size <= 0:
+        parser.error("--fast-hash-size must be > 0")
+    if args.fast_hash_blocks < 0:
+        parser.error("--fast-hash-blocks must be >= 0")
+
+    shard = None
+    if args.shard is not None:
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+
     if args.quiet:
         log_level = logging.ERROR
     else:
@@ -484,10 +867,20 @@ def main():
     logger.info("")
     logger.info("*" * 64)
 
-    sortPhotos(args.src_dir, args.dest_dir, args.sort, args.rename, args.recursive,
-               args.copy, args.test, not args.keep_duplicates, args.day_begins,
-               args.ignore_groups, args.ignore_tags, args.use_only_groups,
-               args.use_only_tags, not args.silent, args.keep_filename)
+    if args.profile:
+        profiling.enable(args.profile, args.profile_sample, args.profile_cprofile)
+
+    try:
+        sortPhotos(args.src_dir, args.dest_dir, args.sort, args.rename, args.recursive,
+                   args.copy, args.test, not args.keep_duplicates, args.day_begins,
+                   args.ignore_groups, args.ignore_tags, args.use_only_groups,
+                   args.use_only_tags, not args.silent, args.keep_filename,
+                   not args.no_hash_cache, args.hash_cache, args.fast_hash_size,
+                   args.fast_hash_blocks, args.infer_dates, args.infer_sample,
+                   args.progress_interval, shard)
+    finally:
+        if args.profile:
+            profiling.disable()
 
 if __name__ == '__main__':
     main()